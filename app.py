@@ -3,22 +3,32 @@
 # 交互：调用NPCManager获取人物设定，LangGraphAgent处理对话逻辑，SessionManager维护会话
 # 约束：不直接处理人物设定、记忆检索或模型调用细节，仅作为请求转发与响应封装层
 
-from flask import Flask, request, jsonify, send_from_directory
-from dotenv import load_dotenv
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
+from flask.json.provider import JSONProvider
+import orjson
 import os
 
 from core.npc.npc_manager import NPCManager
 from core.agent.langgraph_agent import get_langgraph_agent
 from core.session.session_manager import SessionManager
-from core.memory.conversation_log import ConversationLog
 
-# Create conversation log instance
-conversation_log = ConversationLog()
 
-# Load environment variables
-load_dotenv()
+class OrjsonProvider(JSONProvider):
+    """
+    基于 orjson 的 JSON 序列化
+
+    jsonify 与 request.get_json 均经由 app.json，替换后所有路由统一使用 orjson
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__, static_folder="static", static_url_path="/static")
+app.json = OrjsonProvider(app)
 
 # Use absolute paths to avoid working directory issues
 base_dir = os.path.dirname(os.path.abspath(__file__))
@@ -34,6 +44,10 @@ npc_manager = NPCManager(
 
 langgraph_agent = get_langgraph_agent(npc_manager)
 session_mgr = SessionManager()
+# 对话日志由代理写入，接入层直接复用同一实例，避免两份状态
+conversation_log = langgraph_agent.log
+# 页面端接口（/api/*）不区分用户，统一使用该会话ID；对话日志按 (会话ID, NPC) 隔离
+DEFAULT_SESSION_ID = "default"
 
 
 @app.route("/chat", methods=["POST"])
@@ -149,7 +163,7 @@ def api_chat():
         return jsonify({"error": "npc_id and message required"}), 400
     
     reply = langgraph_agent.run(
-        session_id="default",
+        session_id=DEFAULT_SESSION_ID,
         npc_id=npc_id,
         user_text=message,
     )
@@ -158,6 +172,49 @@ def api_chat():
         "response": reply
     })
 
+@app.route("/api/chat/stream", methods=["POST"])
+def api_chat_stream():
+    """
+    API流式聊天接口
+    
+    功能：以 Server-Sent Events 形式逐段返回LangGraphAgent生成的回复
+    请求体：
+    - npc_id (str)：NPC唯一标识
+    - message (str)：用户输入的消息
+    
+    返回：
+    - 200 OK：text/event-stream，每个事件为 {"delta": str}，结束事件为 {"done": true}；
+      生成中途出错时以 {"error": str} 事件结束，不发送 done
+    - 400 Bad Request：{"error": "npc_id and message required"}
+    """
+    data = request.get_json(silent=True) or {}
+
+    npc_id = data.get("npc_id")
+    message = data.get("message")
+
+    if not npc_id or not message:
+        return jsonify({"error": "npc_id and message required"}), 400
+
+    # 上下文在此同步加载：NPC 不存在、记忆召回失败等错误在响应头发送前抛出
+    deltas = langgraph_agent.stream(
+        session_id=DEFAULT_SESSION_ID,
+        npc_id=npc_id,
+        user_text=message,
+    )
+
+    def generate():
+        # 响应头已发送，生成中途的错误只能以事件形式告知前端，且不再发送 done
+        try:
+            for delta in deltas:
+                yield b"data: " + orjson.dumps({"delta": delta}) + b"\n\n"
+        except Exception:
+            app.logger.exception("Chat stream failed for npc %s", npc_id)
+            yield b"data: " + orjson.dumps({"error": "Failed to generate reply"}) + b"\n\n"
+            return
+        yield b"data: " + orjson.dumps({"done": True}) + b"\n\n"
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+
 @app.route("/api/memories/<npc_id>", methods=["GET"])
 def get_memories(npc_id):
     """
@@ -169,16 +226,17 @@ def get_memories(npc_id):
     返回：
     - 200 OK：[{"user_message": str, "assistant_message": str, "timestamp": int}, ...]
     """
-    # Use session_id as npc_id since we're storing by session
-    memories = conversation_log.recent(npc_id, limit=200)
+    # 代理按 (会话ID, NPC) 记录对话，页面端接口使用同一会话ID读取
+    memories = conversation_log.recent(DEFAULT_SESSION_ID, npc_id, limit=200)
     # Convert to frontend format
-    formatted_memories = []
-    for memory in memories:
-        formatted_memories.append({
+    formatted_memories = [
+        {
             "user_message": memory["user"],
             "assistant_message": memory["assistant"],
-            "timestamp": memory["timestamp"]
-        })
+            "timestamp": memory["timestamp"],
+        }
+        for memory in memories
+    ]
     return jsonify(formatted_memories)
 
 @app.route("/api/memories/<npc_id>", methods=["DELETE"])
@@ -191,15 +249,11 @@ def clear_memories(npc_id):
     
     返回：
     - 200 OK：{"message": "Memories cleared successfully"}
-    - 500 Internal Server Error：{"error": "Failed to clear memories"}
     """
-    # Since ConversationLog doesn't have a clear method, we'll add one
-    if hasattr(conversation_log, "_logs"):
-        if npc_id in conversation_log._logs:
-            del conversation_log._logs[npc_id]
-        return jsonify({"message": "Memories cleared successfully"})
-    return jsonify({"error": "Failed to clear memories"}), 500
+    conversation_log.clear(DEFAULT_SESSION_ID, npc_id)
+    return jsonify({"message": "Memories cleared successfully"})
 
 if __name__ == "__main__":
-    # Keep host/port explicit for server usage
+    # 仅用于本地开发；部署请使用 gunicorn（见 gunicorn.conf.py）
+    langgraph_agent.start()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -5,17 +5,95 @@
 
 from __future__ import annotations
 
+import asyncio
+import atexit
+import logging
 import os
-from typing import TypedDict, List, Any, Optional
+import socket
+import threading
+import unicodedata
+from concurrent.futures import Future
+from hashlib import blake2b
+from typing import TypedDict, Dict, List, Any, Optional, Iterator, AsyncIterator, Tuple
 
-from langgraph.graph import StateGraph, END
-from langchain_core.messages import HumanMessage, AIMessage
+import httpx
+from cachetools import TTLCache
+from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 
+from core.config import settings
 from core.npc.npc_manager import NPCManager
 from core.memory.memory_store import MemoryStore
 from core.memory.conversation_log import ConversationLog
 
+logger = logging.getLogger(__name__)
+
+# 归一化用户输入时去除的首尾标点（NFKC 之后全角标点已转为半角）
+_QUERY_STRIP = " .,!?~;:、。…"
+
+
+def _normalize_query(text: str) -> str:
+    """
+    归一化用户输入，用于回复缓存键
+
+    "你好！"、" 你好 "、"你好～" 等仅在全半角、空白、首尾标点或大小写上不同的输入归为同一键
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split()).strip(_QUERY_STRIP).casefold()
+
+
+def _new_http_client() -> httpx.Client:
+    """共享 HTTP/2 连接池：所有 LLM 调用复用长连接，避免重复 TLS 握手"""
+    return httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+
+
+def _new_async_http_client() -> httpx.AsyncClient:
+    """
+    异步调用（ainvoke/astream）使用的连接池
+
+    连接池绑定首个使用它的事件循环，因此按事件循环各建一个，见 LangGraphAgent._async_llm
+    """
+    return httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=32),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+
+
+def _abort_async_http_client(client: httpx.AsyncClient) -> None:
+    """
+    断开已关闭事件循环遗留的异步连接池中的连接
+
+    循环关闭后无法再 await client.aclose()（关闭底层传输需要向该循环调度回调），
+    因此直接对各连接的套接字执行 shutdown，立即释放与服务端的 TCP 连接；
+    文件描述符随连接池对象回收一并关闭
+    """
+    pool = getattr(client._transport, "_pool", None)
+    for conn in getattr(pool, "connections", ()):
+        stream = getattr(getattr(conn, "_connection", None), "_network_stream", None)
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        if sock is None:
+            continue
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # 对端已断开
+
+
+_shared_http = _new_http_client()
+
+
+def _shutdown() -> None:
+    """进程退出时关闭连接池（长期记忆的落库由 MemoryStore 自行收尾）"""
+    _shared_http.close()
+
+
+atexit.register(_shutdown)
+
 
 class AgentState(TypedDict):
     """
@@ -56,23 +134,90 @@ class LangGraphAgent:
         参数：
         - npc_manager (NPCManager)：NPC管理器实例
         """
+        # 先解析配置：同时载入 .env，后续 PowerMem 初始化依赖其中的环境变量
+        self.settings = settings()
         self.npc_manager = npc_manager
-        self.memory = MemoryStore()
-        self.log = ConversationLog()
+        # 攒批轮数不超过近期对话窗口轮数（Settings 校验），避免按轮数必然出现的召回空档
+        self.memory = MemoryStore(batch_turns=self.settings.memory_batch_turns)
+        # 近期对话只保留最近 K 轮进入 prompt，更早的内容由 PowerMem 按需召回
+        self.log = ConversationLog(window_turns=self.settings.history_turns)
         self.llm = self._build_llm()
-        self.graph = self._build_graph()
+        # 事件循环 -> 绑定该循环专属异步连接池的 LLM 实例；已关闭循环的条目在新循环接入时清理
+        self._async_llms: Dict[asyncio.AbstractEventLoop, ChatOpenAI] = {}
+        self._async_llm_lock = threading.Lock()
+        # 回复缓存：(npc_id, 上下文摘要) -> 回复；RESPONSE_CACHE_TTL 为 0 时关闭
+        self._resp_cache: Optional[TTLCache] = None
+        if self.settings.response_cache_ttl > 0:
+            self._resp_cache = TTLCache(maxsize=4096, ttl=self.settings.response_cache_ttl)
+        self._cache_lock = threading.Lock()
+        # npc_id -> (NPCManager 返回的设定对象, 对应的人物设定 SystemMessage)
+        self._system_messages: Dict[str, Tuple[Dict, SystemMessage]] = {}
+        # 进行中的 LLM 调用：相同缓存键的并发请求合并为一次调用
+        self._inflight: Dict[Tuple[str, bytes], Future] = {}
+        # 线性流程：节点名 -> 节点函数，图构建与直连执行共用同一份定义
+        self._nodes = (
+            ("load_context", self._load_context),
+            ("generate", self._generate),
+        )
+        # 仅在需要外部追踪（LangSmith 等）时才编译 StateGraph
+        self.graph = self._build_graph() if self.settings.langgraph_trace else None
+
+    # -------------------------
+    # 启动预热
+    # -------------------------
+    def start(self) -> None:
+        """
+        在当前进程开始后台准备工作：打开 PowerMem，设置 WARMUP=1 时另起线程预热
+
+        设计：
+        - 构造时不做任何后台工作：gunicorn preload 下构造发生在主进程，在其中打开的 PowerMem
+          与建立的 LLM 连接都会在 fork 后被 worker 丢弃，预热请求白白计费
+        - 由 gunicorn 的 post_fork（每个 worker 各一次）或本地开发入口调用
+        """
+        self.memory.start()
+        if self.settings.warmup:
+            threading.Thread(target=self._warmup, name="agent-warmup", daemon=True).start()
+
+    def _warmup(self) -> None:
+        """
+        后台预热（设置 WARMUP=1 时启用）
+        
+        功能：
+        - 预先构建所有 NPC 的人物设定与系统提示缓存
+        - 执行一次长期记忆检索，提前加载嵌入模型与索引
+        - 发送一次极短的 LLM 请求，提前完成 TLS 握手与连接池建立
+        
+        设计：
+        - 由 start() 在 worker 进程内启动，在启动到首个请求之间的空闲期完成，失败不影响正常服务
+        """
+        try:
+            for npc in self.npc_manager.get_all_npcs():
+                self.npc_manager.get_npc(npc["id"])
+        except Exception:
+            logger.warning("NPC warmup failed", exc_info=True)
+
+        try:
+            self.memory.warmup()
+        except Exception:
+            logger.warning("Memory warmup failed", exc_info=True)
+
+        try:
+            self.llm.invoke([HumanMessage(content="ok")])
+        except Exception:
+            logger.warning("LLM warmup failed", exc_info=True)
 
     # -------------------------
     # 构建 LLM
     # -------------------------
-    def _build_llm(self) -> ChatOpenAI:
+    def _build_llm(self, http_async_client: Optional[httpx.AsyncClient] = None) -> ChatOpenAI:
         """
         构建LLM实例（兼容DashScope OpenAI兼容模式）
         
-        支持的环境变量：
-        - API_KEY / OPENAI_API_KEY / DASHSCOPE_API_KEY：API密钥
-        - API_BASE_URL / OPENAI_BASE_URL：API基础地址
-        - MODEL_NAME / OPENAI_MODEL：模型名称，默认"qwen-turbo"
+        配置来源：core.config.settings()
+        
+        参数：
+        - http_async_client (Optional[httpx.AsyncClient])：异步调用使用的连接池；
+          同步实例不传，异步实例由 _async_llm 按事件循环传入
         
         返回：
         - ChatOpenAI：配置好的LLM实例
@@ -80,61 +225,105 @@ class LangGraphAgent:
         异常：
         - RuntimeError：缺少API密钥时抛出
         """
-        api_key = os.getenv("OPENAI_API_KEY") or os.getenv("API_KEY") or os.getenv("DASHSCOPE_API_KEY")
-        base_url = os.getenv("OPENAI_BASE_URL") or os.getenv("API_BASE_URL")
-        model = os.getenv("OPENAI_MODEL") or os.getenv("MODEL_NAME") or "qwen-turbo"
-
-        if not api_key:
+        cfg = self.settings
+        if not cfg.api_key:
             raise RuntimeError("Missing API key: set API_KEY (or OPENAI_API_KEY) in .env")
 
         llm = ChatOpenAI(
-            api_key=api_key,
-            base_url=base_url,
-            model=model,
+            api_key=cfg.api_key,
+            base_url=cfg.base_url,
+            model=cfg.model,
+            http_client=_shared_http,
+            http_async_client=http_async_client,
         )
         return llm
 
+    def _async_llm(self) -> ChatOpenAI:
+        """
+        获取当前事件循环专属的LLM实例（供 arun/astream 使用）
+        
+        返回：
+        - ChatOpenAI：使用本循环异步连接池的LLM实例
+        
+        设计：
+        - httpx.AsyncClient 的连接绑定首个使用它的事件循环，跨循环复用会报
+          "attached to a different loop"，因此每个事件循环各建一个连接池与 LLM 实例
+        - 连接池内部持有其事件循环的引用，弱引用缓存无法释放；改为在新循环接入时
+          移除已关闭循环的条目，并断开其连接池中遗留的连接
+        """
+        loop = asyncio.get_running_loop()
+        llm = self._async_llms.get(loop)
+        if llm is None:
+            with self._async_llm_lock:
+                llm = self._async_llms.get(loop)
+                if llm is None:
+                    for closed in [l for l in self._async_llms if l.is_closed()]:
+                        _abort_async_http_client(self._async_llms.pop(closed).http_async_client)
+                    llm = self._async_llms[loop] = self._build_llm(_new_async_http_client())
+        return llm
+
     # -------------------------
     # LangGraph 构建
     # -------------------------
     def _build_graph(self):
         """
-        构建LangGraph状态图
+        构建LangGraph状态图（设置 LANGGRAPH_TRACE 时启用）
         
         返回：
         - 编译后的LangGraph图实例
         """
+        # 仅追踪模式需要 langgraph，按需导入，默认路径不承担其导入开销
+        from langgraph.graph import StateGraph, END
+
         g = StateGraph(AgentState)
-        g.add_node("load_context", self._load_context)
-        g.add_node("generate", self._generate)
+        for name, node in self._nodes:
+            g.add_node(name, node)
 
-        g.set_entry_point("load_context")
-        g.add_edge("load_context", "generate")
-        g.add_edge("generate", END)
+        names = [name for name, _ in self._nodes]
+        g.set_entry_point(names[0])
+        for src, dst in zip(names, names[1:]):
+            g.add_edge(src, dst)
+        g.add_edge(names[-1], END)
 
         return g.compile()
 
+    def _pipeline(self, state: AgentState) -> AgentState:
+        """
+        直连执行流程（默认路径）
+        
+        参数：
+        - state (AgentState)：初始代理状态
+        
+        返回：
+        - AgentState：执行完所有节点后的代理状态
+        
+        设计：
+        - 流程为纯线性，按顺序调用各节点，并将其返回的增量原地合并进同一个 state
+        - 省去图调度与节点间的状态复制开销
+        """
+        for _, node in self._nodes:
+            state.update(node(state))
+        return state
+
     # -------------------------
     # Node: load_context
     # -------------------------
-    def _load_context(self, state: AgentState) -> AgentState:
+    def _load_context(self, state: AgentState) -> Dict[str, Any]:
         """
         加载对话上下文节点
         
         功能：
-        - 获取NPC的系统提示
+        - 获取NPC的系统提示（稳定前缀）
         - 从长期记忆中召回相关记忆
+        - 拼接近期对话窗口（动态上下文，追加在同一条 system 消息的人物设定之后）
         - 构建完整的上下文消息
         
         参数：
         - state (AgentState)：当前代理状态
         
         返回：
-        - AgentState：更新后的代理状态，包含完整的上下文消息
+        - Dict[str, Any]：状态增量，仅包含完整的上下文消息 messages
         """
-        npc_id = state["npc_id"]
-        npc = self.npc_manager.get_npc(npc_id)
-
         # 找到最新一条用户输入
         user_text = ""
         for m in reversed(state["messages"]):
@@ -142,42 +331,76 @@ class LangGraphAgent:
                 user_text = m.content
                 break
 
-        # 从 PowerMem 召回长期记忆
+        npc = self.npc_manager.get_npc(state["npc_id"])
+
+        # 从 PowerMem 召回长期记忆：在请求线程内直接执行（gthread 每个请求已独占一个线程，
+        # 另设线程池只会让召回在池满时排队；人物设定与近期对话均为缓存读取，无需与之并行）
         memory_block = self.memory.recall(
             session_id=state["session_id"],
             query=user_text,
             k=5,
         )
+        # 近期对话窗口（ConversationLog 增量维护，无需逐条格式化）
+        history_block = self.log.format_recent(state["session_id"], state["npc_id"])
 
-        system_prompt = npc["prompt"]
+        # 消息结构与基线一致：唯一一条 system 消息 + 用户输入
+        # 人物设定逐字不变地置于 system 消息开头，每轮变化的记忆/近期对话追加在其后，
+        # 服务端前缀缓存仍可跨轮命中人物设定部分
+        context_blocks = []
         if memory_block:
-            system_prompt += f"\n\n【长期记忆】\n{memory_block}"
+            context_blocks.append(f"【长期记忆】\n{memory_block}")
+        if history_block:
+            context_blocks.append(f"【近期对话】\n{history_block}")
 
-        # 将 system prompt 作为首条消息
-        state["messages"] = [AIMessage(content=system_prompt)] + state["messages"]
-        return state
+        if context_blocks:
+            system = SystemMessage(content="\n\n".join([npc["prompt"], *context_blocks]))
+        else:
+            system = self._system_message(npc)
+
+        messages: List[Any] = [system]
+        messages.extend(state["messages"])
+        return {"messages": messages}
+
+    def _system_message(self, npc: Dict) -> SystemMessage:
+        """
+        获取NPC的人物设定消息（按 NPC 复用，用于本轮无记忆/近期对话的情况）
+        
+        参数：
+        - npc (Dict)：NPCManager.get_npc 返回的设定对象
+        
+        返回：
+        - SystemMessage：人物设定消息
+        
+        设计：
+        - 以设定对象本身作为版本标识：NPCManager 缓存失效后会返回新对象，此处随之重建
+        """
+        cached = self._system_messages.get(npc["id"])
+        if cached is not None and cached[0] is npc:
+            return cached[1]
+        message = SystemMessage(content=npc["prompt"])
+        self._system_messages[npc["id"]] = (npc, message)
+        return message
 
     # -------------------------
     # Node: generate
     # -------------------------
-    def _generate(self, state: AgentState) -> AgentState:
+    def _generate(self, state: AgentState) -> Dict[str, Any]:
         """
         生成回复节点
         
         功能：
-        - 调用LLM生成回复
+        - 命中回复缓存或合并进行中的相同请求，否则调用LLM生成回复
         - 记录对话到短期日志
-        - 将对话内容提交到长期记忆
+        - 将对话内容异步提交到长期记忆
         
         参数：
         - state (AgentState)：当前代理状态
         
         返回：
-        - AgentState：更新后的代理状态，包含生成的回复
+        - Dict[str, Any]：状态增量，仅包含生成的回复 response
         """
-        resp = self.llm.invoke(state["messages"])
-        assistant_text = resp.content
-        state["response"] = assistant_text
+        cache_key = self._cache_key(state["npc_id"], state["messages"])
+        assistant_text = self._invoke_llm(cache_key, state["messages"])
 
         # 提取当前轮 user_text（本基础版：单轮输入）
         user_text = ""
@@ -186,15 +409,109 @@ class LangGraphAgent:
                 user_text = m.content
                 break
 
-        # 记录对话日志（用于展示/窗口）
-        self.log.append(state["session_id"], user_text, assistant_text)
+        self._record(state["session_id"], state["npc_id"], user_text, assistant_text)
+        return {"response": assistant_text}
+
+    # -------------------------
+    # 回复缓存
+    # -------------------------
+    def _cache_key(self, npc_id: str, messages: List[Any]) -> Optional[Tuple[str, bytes]]:
+        """
+        计算回复缓存键
+        
+        参数：
+        - npc_id (str)：NPC唯一标识
+        - messages (List[Any])：完整上下文消息（含系统提示、记忆、近期对话与用户输入）
+        
+        返回：
+        - Optional[Tuple[str, bytes]]：缓存键；缓存关闭时返回 None
+        
+        设计：
+        - 系统提示与上下文按原文参与计算；用户输入先归一化，近似重复的提问共用缓存
+        """
+        if self._resp_cache is None:
+            return None
+        h = blake2b(digest_size=16)
+        for m in messages:
+            text = _normalize_query(m.content) if isinstance(m, HumanMessage) else m.content
+            h.update(text.encode("utf-8"))
+            h.update(b"\x00")
+        return npc_id, h.digest()
 
-        # 写入长期记忆（PowerMem infer=True）
-        self.memory.commit(state["session_id"], user_text, assistant_text)
+    def _cached_response(self, key: Optional[Tuple[str, bytes]]) -> Optional[str]:
+        if key is None:
+            return None
+        with self._cache_lock:
+            return self._resp_cache.get(key)
 
-        # 追加到 messages（可选：后续若要多轮窗口可用）
-        state["messages"].append(AIMessage(content=assistant_text))
-        return state
+    def _store_response(self, key: Optional[Tuple[str, bytes]], text: str) -> None:
+        if key is None or not text:
+            return
+        with self._cache_lock:
+            self._resp_cache[key] = text
+
+    def _invoke_llm(self, key: Optional[Tuple[str, bytes]], messages: List[Any]) -> str:
+        """
+        调用LLM生成回复（带缓存与并发合并）
+        
+        参数：
+        - key (Optional[Tuple[str, bytes]])：回复缓存键；为 None 时直接调用
+        - messages (List[Any])：完整上下文消息
+        
+        返回：
+        - str：AI生成的回复内容
+        
+        设计：
+        - 缓存命中直接返回
+        - 同一缓存键已有调用在进行时，等待其结果而不重复请求（突发的相同问候只打一次LLM）
+        """
+        if key is None:
+            return self.llm.invoke(messages).content
+
+        with self._cache_lock:
+            text = self._resp_cache.get(key)
+            if text is not None:
+                return text
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        try:
+            text = self.llm.invoke(messages).content
+            self._store_response(key, text)
+            pending.set_result(text)
+            return text
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._cache_lock:
+                self._inflight.pop(key, None)
+
+    # -------------------------
+    # 对话落盘
+    # -------------------------
+    def _record(self, session_id: str, npc_id: str, user_text: str, assistant_text: str) -> None:
+        """
+        记录一轮完整对话
+        
+        参数：
+        - session_id (str)：会话ID
+        - npc_id (str)：NPC唯一标识
+        - user_text (str)：用户输入的消息
+        - assistant_text (str)：AI生成的回复
+        """
+        # 记录对话日志（用于展示/窗口）
+        self.log.append(session_id, npc_id, user_text, assistant_text)
+
+        # 写入长期记忆（PowerMem infer=True），MemoryStore 后台批量落库，不阻塞回复
+        self.memory.commit(session_id, user_text, assistant_text)
 
     # -------------------------
     # 对外运行接口
@@ -217,14 +534,156 @@ class LangGraphAgent:
             "messages": [HumanMessage(content=user_text)],
             "response": "",
         }
-        final_state = self.graph.invoke(init_state)
+        if self.graph is not None:
+            final_state = self.graph.invoke(init_state)
+        else:
+            final_state = self._pipeline(init_state)
         return final_state["response"]
 
+    async def arun(self, session_id: str, npc_id: str, user_text: str) -> str:
+        """
+        异步运行接口（供 ASGI 等异步调用方使用）
+        
+        参数：
+        - session_id (str)：会话ID
+        - npc_id (str)：NPC唯一标识
+        - user_text (str)：用户输入的消息
+        
+        返回：
+        - str：AI生成的回复内容
+        
+        设计：
+        - 上下文加载（含阻塞的记忆召回）放到线程中执行，不阻塞事件循环
+        - LLM 调用使用 ainvoke，单进程可同时挂起多路请求
+        """
+        state: AgentState = {
+            "session_id": session_id,
+            "npc_id": npc_id,
+            "messages": [HumanMessage(content=user_text)],
+            "response": "",
+        }
+        state.update(await asyncio.to_thread(self._load_context, state))
+
+        cache_key = self._cache_key(npc_id, state["messages"])
+        assistant_text = self._cached_response(cache_key)
+        if assistant_text is None:
+            resp = await self._async_llm().ainvoke(state["messages"])
+            assistant_text = resp.content
+            self._store_response(cache_key, assistant_text)
+
+        self._record(session_id, npc_id, user_text, assistant_text)
+        return assistant_text
+
+    def stream(self, session_id: str, npc_id: str, user_text: str) -> Iterator[str]:
+        """
+        流式运行接口
+        
+        参数：
+        - session_id (str)：会话ID
+        - npc_id (str)：NPC唯一标识
+        - user_text (str)：用户输入的消息
+        
+        返回：
+        - Iterator[str]：逐段产出的AI回复文本
+        
+        设计：
+        - 复用 load_context 节点构建上下文，绕过整图执行（图执行会缓冲完整回复）
+        - 上下文在调用时立即加载（而非首次迭代时），NPC 不存在等错误在返回迭代器前抛出，
+          调用方可在开始发送响应前处理
+        - 仅在完整生成结束后记录对话日志与长期记忆；生成中途出错或客户端中断时不记录、不缓存
+        """
+        state: AgentState = {
+            "session_id": session_id,
+            "npc_id": npc_id,
+            "messages": [HumanMessage(content=user_text)],
+            "response": "",
+        }
+        state.update(self._load_context(state))
+
+        cache_key = self._cache_key(npc_id, state["messages"])
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            self._record(session_id, npc_id, user_text, cached)
+            return iter((cached,))
+
+        return self._stream_llm(state, user_text, cache_key)
+
+    def _stream_llm(
+        self,
+        state: AgentState,
+        user_text: str,
+        cache_key: Optional[Tuple[str, bytes]],
+    ) -> Iterator[str]:
+        """
+        逐段产出 LLM 回复，正常结束后记录对话并写入回复缓存
+        
+        参数：
+        - state (AgentState)：已加载上下文的代理状态
+        - user_text (str)：用户输入的消息
+        - cache_key (Optional[Tuple[str, bytes]])：回复缓存键
+        
+        返回：
+        - Iterator[str]：逐段产出的AI回复文本
+        """
+        parts: List[str] = []
+        for chunk in self.llm.stream(state["messages"]):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+
+        assistant_text = "".join(parts)
+        if assistant_text:
+            self._record(state["session_id"], state["npc_id"], user_text, assistant_text)
+        self._store_response(cache_key, assistant_text)
+
+    async def astream(self, session_id: str, npc_id: str, user_text: str) -> AsyncIterator[str]:
+        """
+        异步流式运行接口
+        
+        参数：
+        - session_id (str)：会话ID
+        - npc_id (str)：NPC唯一标识
+        - user_text (str)：用户输入的消息
+        
+        返回：
+        - AsyncIterator[str]：逐段产出的AI回复文本
+        
+        设计：
+        - 与 stream 行为一致，LLM 调用走 astream，等待期间不占用事件循环
+        """
+        state: AgentState = {
+            "session_id": session_id,
+            "npc_id": npc_id,
+            "messages": [HumanMessage(content=user_text)],
+            "response": "",
+        }
+        state.update(await asyncio.to_thread(self._load_context, state))
+
+        cache_key = self._cache_key(npc_id, state["messages"])
+        cached = self._cached_response(cache_key)
+        if cached is not None:
+            self._record(session_id, npc_id, user_text, cached)
+            yield cached
+            return
+
+        parts: List[str] = []
+        async for chunk in self._async_llm().astream(state["messages"]):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+
+        # 仅在完整生成结束后记录，中途出错或被取消时不记录、不缓存
+        assistant_text = "".join(parts)
+        if assistant_text:
+            self._record(session_id, npc_id, user_text, assistant_text)
+        self._store_response(cache_key, assistant_text)
+
 
 # -----------------------------
 # 工厂函数：与 app.py 兼容
 # -----------------------------
 _agent_singleton: Optional[LangGraphAgent] = None
+_agent_lock = threading.Lock()
 
 
 def get_langgraph_agent(npc_manager: NPCManager) -> LangGraphAgent:
@@ -239,9 +698,31 @@ def get_langgraph_agent(npc_manager: NPCManager) -> LangGraphAgent:
     
     设计：
     - 使用单例模式，避免重复创建代理实例
-    - 确保整个应用中只有一个代理实例在运行
+    - 双重检查加锁，并发首请求下也只构建一次（LLM 客户端、记忆库初始化开销较大）
     """
     global _agent_singleton
     if _agent_singleton is None:
-        _agent_singleton = LangGraphAgent(npc_manager)
+        with _agent_lock:
+            if _agent_singleton is None:
+                _agent_singleton = LangGraphAgent(npc_manager)
     return _agent_singleton
+
+
+def _reinit_after_fork() -> None:
+    """
+    fork 后在子进程中重建连接池
+
+    设计：
+    - gunicorn --preload 在主进程构建好代理后再 fork worker
+    - TLS 连接不能在进程间共享，需在子进程内重建
+    """
+    global _shared_http
+    _shared_http = _new_http_client()
+    if _agent_singleton is not None:
+        _agent_singleton.llm = _agent_singleton._build_llm()
+        # 父进程中按事件循环建立的异步连接池不可在子进程中使用，首次异步调用时重建
+        _agent_singleton._async_llms = {}
+        _agent_singleton._async_llm_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reinit_after_fork)
@@ -0,0 +1,78 @@
+# core/config.py
+# 运行配置
+# 职责：集中解析 .env 与环境变量，整个进程只解析一次
+# 设计：settings() 首次调用时加载 .env 并缓存结果，返回不可变配置对象
+
+import functools
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """
+    运行配置
+
+    字段说明：
+    - api_key (Optional[str])：LLM API密钥
+    - base_url (Optional[str])：LLM API基础地址
+    - model (str)：模型名称
+    - langgraph_trace (bool)：是否编译 StateGraph 以便外部追踪
+    - response_cache_ttl (int)：回复缓存有效期（秒），0 表示关闭
+    - warmup (bool)：每个 worker 启动后是否在后台预热 LLM 连接、长期记忆检索与人物设定缓存
+    - history_turns (int)：prompt 中保留的近期对话轮数
+    - memory_batch_turns (int)：长期记忆攒批写入的轮数，不得超过 history_turns
+    """
+    api_key: Optional[str]
+    base_url: Optional[str]
+    model: str
+    langgraph_trace: bool
+    response_cache_ttl: int
+    warmup: bool
+    history_turns: int
+    memory_batch_turns: int
+
+    def __post_init__(self):
+        # 尚未落库的轮次只能通过近期对话窗口进入 prompt，批大小超过窗口轮数必然出现召回空档；
+        # 窗口另有字符上限（format_recent 的 max_chars），回复较长时未落库的早期轮次仍可能被截掉，
+        # 此校验只排除按轮数必然出现的空档
+        if not 1 <= self.memory_batch_turns <= self.history_turns:
+            raise ValueError(
+                f"MEMORY_BATCH_TURNS ({self.memory_batch_turns}) must be between 1 and "
+                f"HISTORY_TURNS ({self.history_turns})"
+            )
+
+
+@functools.cache
+def settings() -> Settings:
+    """
+    获取运行配置
+
+    支持的环境变量：
+    - API_KEY / OPENAI_API_KEY / DASHSCOPE_API_KEY：API密钥
+    - API_BASE_URL / OPENAI_BASE_URL：API基础地址
+    - MODEL_NAME / OPENAI_MODEL：模型名称，默认"qwen-turbo"
+    - LANGGRAPH_TRACE：非空时启用 StateGraph 追踪
+    - RESPONSE_CACHE_TTL：回复缓存有效期（秒），默认0（关闭）
+    - WARMUP：为 "1" 时启动后台预热
+    - HISTORY_TURNS：prompt 中保留的近期对话轮数，默认6
+    - MEMORY_BATCH_TURNS：长期记忆攒批写入的轮数，默认 min(4, HISTORY_TURNS)
+
+    返回：
+    - Settings：缓存的配置对象（同时已将 .env 载入环境变量，供 PowerMem 等读取）
+    """
+    load_dotenv()
+    history_turns = int(os.getenv("HISTORY_TURNS") or 6)
+    return Settings(
+        api_key=os.getenv("OPENAI_API_KEY") or os.getenv("API_KEY") or os.getenv("DASHSCOPE_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL") or os.getenv("API_BASE_URL"),
+        model=os.getenv("OPENAI_MODEL") or os.getenv("MODEL_NAME") or "qwen-turbo",
+        langgraph_trace=bool(os.getenv("LANGGRAPH_TRACE")),
+        response_cache_ttl=int(os.getenv("RESPONSE_CACHE_TTL") or 0),
+        warmup=os.getenv("WARMUP") == "1",
+        history_turns=history_turns,
+        memory_batch_turns=int(os.getenv("MEMORY_BATCH_TURNS") or min(4, history_turns)),
+    )
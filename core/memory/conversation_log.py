@@ -1,10 +1,11 @@
 # core/memory/conversation_log.py
 # 对话日志管理器
-# 职责：存储和检索短期对话历史，用于前端展示
-# 设计：内存存储，重启后数据会丢失，仅用于展示最近的对话内容
+# 职责：存储和检索短期对话历史，用于前端展示，并提供拼接进系统提示词的近期对话窗口
+# 设计：内存存储，重启后数据会丢失
 
 import time
-from typing import List, Dict
+from collections import deque
+from typing import Deque, List, Dict, Tuple
 
 
 class ConversationLog:
@@ -14,48 +15,69 @@ class ConversationLog:
     职责：
     - 存储会话的短期对话历史
     - 提供最近对话的查询接口
-    - 支持按会话ID管理不同的对话记录
+    - 支持按 (会话ID, NPC) 管理不同的对话记录
     
     设计：
     - 内存存储，重启后数据会丢失
-    - 仅用于前端展示，与长期记忆(PowerMem)严格分离
-    - 按会话ID组织对话记录，防止记忆串用
+    - 每个会话只保留最近 max_entries 条记录（有界环形缓冲），内存不随会话时长增长
+    - 对话记录用于前端展示；近期对话窗口以【近期对话】拼接进 LLM 系统提示词，与长期记忆(PowerMem)各自独立存储
+    - 按 (会话ID, NPC) 组织对话记录，同一会话与不同 NPC 的对话互不可见，防止记忆串用
+    - 额外维护预格式化的近期对话窗口（最近 window_turns 轮），供 prompt 直接拼接
     """
 
-    def __init__(self):
+    def __init__(self, window_turns: int = 6, max_entries: int = 500):
         """
         初始化对话日志管理器
         
-        创建一个空的对话日志字典，键为会话ID，值为对话记录列表
+        参数：
+        - window_turns (int)：近期对话窗口保留的轮数，默认6轮
+        - max_entries (int)：每个会话保留的最大记录数，默认500条
+        
+        创建一个空的对话日志字典，键为 (会话ID, NPC唯一标识)，值为有界的对话记录队列
         """
-        self._logs: Dict[str, List[Dict]] = {}
+        self._logs: Dict[Tuple[str, str], Deque[Dict]] = {}
+        self._max_entries = max_entries
+        self._window_turns = window_turns
+        # 预格式化的 "用户：.../角色：..." 行，随 append 增量维护
+        self._windows: Dict[Tuple[str, str], Deque[str]] = {}
 
-    def append(self, session_id: str, user_msg: str, ai_msg: str):
+    def append(self, session_id: str, npc_id: str, user_msg: str, ai_msg: str):
         """
         添加对话记录到指定会话
         
         参数：
         - session_id (str)：会话ID
+        - npc_id (str)：NPC唯一标识
         - user_msg (str)：用户输入的消息
         - ai_msg (str)：AI生成的回复
         
         功能：
-        - 如果会话ID不存在，自动创建新的会话记录列表
+        - 如果会话ID不存在，自动创建新的会话记录队列
+        - 超出 max_entries 时自动丢弃最早的记录
         - 为每条记录添加时间戳（秒级）
         - 将用户消息和AI回复存储为字典格式
+        - 同步追加格式化行到近期对话窗口
         """
-        self._logs.setdefault(session_id, []).append({
+        key = (session_id, npc_id)
+        # setdefault 是原子操作：同一会话的并发首条写入共用同一个队列，不会互相覆盖丢失记录
+        log = self._logs.setdefault(key, deque(maxlen=self._max_entries))
+        log.append({
             "timestamp": int(time.time()),
             "user": user_msg,
             "assistant": ai_msg,
         })
 
-    def recent(self, session_id: str, limit: int = 6) -> List[Dict]:
+        window = self._windows.setdefault(key, deque(maxlen=self._window_turns * 2))
+        window.append(f"用户：{user_msg}")
+        window.append(f"角色：{ai_msg}")
+
+    def recent(self, session_id: str, npc_id: str, limit: int = 6) -> List[Dict]:
         """
         获取指定会话的最近对话记录
         
         参数：
         - session_id (str)：会话ID
+        - npc_id (str)：NPC唯一标识
         - limit (int)：返回的最大记录数，默认6条
         
         返回：
@@ -65,4 +87,56 @@ class ConversationLog:
         - 如果会话ID不存在，返回空列表
         - 返回最近的limit条记录，按时间顺序排列
         """
-        return self._logs.get(session_id, [])[-limit:]
+        log = self._logs.get((session_id, npc_id))
+        if not log:
+            return []
+        # 从尾部按下标只取 limit 条，不复制整个队列；不使用迭代器，
+        # 并发 append 不会触发 "deque mutated during iteration"（队列只增长或保持满长度，负下标始终有效）
+        return [log[i] for i in range(-min(limit, len(log)), 0)]
+
+    def clear(self, session_id: str, npc_id: str):
+        """
+        清除指定会话的对话记录
+        
+        参数：
+        - session_id (str)：会话ID
+        - npc_id (str)：NPC唯一标识
+        
+        功能：
+        - 同时清除对话记录与近期对话窗口；会话不存在时不做任何操作
+        """
+        key = (session_id, npc_id)
+        self._logs.pop(key, None)
+        self._windows.pop(key, None)
+
+    def format_recent(self, session_id: str, npc_id: str, max_chars: int = 1800) -> str:
+        """
+        获取指定会话已格式化的近期对话文本
+        
+        参数：
+        - session_id (str)：会话ID
+        - npc_id (str)：NPC唯一标识
+        - max_chars (int)：返回文本的最大字符数，默认1800
+        
+        返回：
+        - str：按时间顺序排列的对话行，会话不存在时返回空字符串
+        
+        功能：
+        - 直接拼接预格式化窗口，不再逐条访问对话记录字典
+        - 从最新一行向前累积，达到 max_chars 即停止，只拼接需要的尾部
+        - 遍历窗口快照，并发 append 不会打断格式化
+        """
+        window = self._windows.get((session_id, npc_id))
+        if not window:
+            return ""
+        # 窗口可能被并发请求的 append 修改，先取快照再遍历（窗口只有 window_turns*2 行）
+        lines = tuple(window)
+
+        tail: Deque[str] = deque()
+        total = -1  # 首行不计换行符
+        for line in reversed(lines):
+            tail.appendleft(line)
+            total += len(line) + 1
+            if total >= max_chars:
+                return "\n".join(tail)[-max_chars:]
+        return "\n".join(tail)
@@ -1,43 +1,233 @@
-from typing import List
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
 from powermem import Memory, auto_config
 
+logger = logging.getLogger(__name__)
+
+
+def _dict_text(item: Dict) -> str:
+    return item.get("memory") or item.get("content") or item.get("text") or ""
+
 
 class MemoryStore:
     """
     官方 PowerMem 的唯一封装层
+
+    写入采用 write-behind：按会话缓冲对话，攒满 batch_turns 轮或每隔 flush_interval 秒
+    合并为一次 add（一次 infer 抽取）。未落库的轮次只能经近期对话窗口进入 prompt，
+    batch_turns 应不超过窗口轮数（LangGraphAgent 取自经 Settings 校验的 memory_batch_turns）；
+    窗口按字符数截断时，较早的未落库轮次可能暂时不可见，直到本批写入
+
+    add 在后台线程池执行，commit 不等待写入完成；进行中的写入超过 max_pending 批时
+    commit 阻塞等待（背压），避免积压无限增长
+
+    PowerMem（嵌入模型、索引）在后台线程中打开：构造时不打开，由 start() 或首次使用触发，
+    gunicorn preload 下由各 worker 在 fork 之后自行打开（见 gunicorn.conf.py 的 post_fork）。
+    检索最多等待 recall_timeout 秒、写入最多等待 open_timeout 秒，未就绪或打开失败时降级为
+    无长期记忆（检索返回空、写入丢弃并记录日志），不影响对话本身；wait_ready() 可用于健康检查
     """
 
-    def __init__(self):
-        config = auto_config()
-        self._memory = Memory(config=config)
+    def __init__(
+        self,
+        batch_turns: int = 4,
+        flush_interval: float = 30.0,
+        max_pending: int = 64,
+        recall_timeout: float = 5.0,
+        open_timeout: float = 60.0,
+    ):
+        self._recall_timeout = recall_timeout
+        self._open_timeout = open_timeout
+        self._reset_open_state()
+
+        self._batch_turns = batch_turns
+        self._flush_interval = flush_interval
+        self._pending: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+        self._max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="mem-io")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._closed = threading.Event()
+        # 检索结果的文本提取函数，按首个结果的类型绑定一次
+        self._extract: Optional[Callable[[object], str]] = None
+
+        self._start_flusher()
+        os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.close)
 
     def recall(self, session_id: str, query: str, k: int = 5) -> str:
         if not query:
             return ""
 
-        results = self._memory.search(
+        store = self._store(self._recall_timeout)
+        if store is None:
+            return ""
+
+        results = store.search(
             query=query,
             user_id=session_id,
             limit=k
         )
+        # PowerMem 返回 {"results": [...], "relations": [...]}，条目的文本在 "memory" 字段
+        if isinstance(results, dict):
+            results = results.get("results", [])
+
+        if not results:
+            return ""
+
+        extract = self._extract
+        if extract is None:
+            extract = self._extract = _dict_text if isinstance(results[0], dict) else str
 
-        lines: List[str] = []
-        for item in results:
-            if isinstance(item, dict):
-                text = item.get("content") or item.get("text") or ""
-            else:
-                text = str(item)
-            if text:
-                lines.append(f"- {text}")
+        return "\n".join(f"- {text}" for text in map(extract, results) if text)
 
-        return "\n".join(lines)
+    def warmup(self):
+        """
+        预热检索链路（加载嵌入模型、打开索引），避免首个召回请求承担冷启动开销
+        """
+        store = self._store(self._open_timeout)
+        if store is None:
+            raise RuntimeError("PowerMem is not available")
+        store.search(query="warmup", user_id="__warmup__", limit=1)
+
+    def start(self):
+        """
+        在后台开始打开 PowerMem（幂等），用于在首个请求之前提前加载
+        """
+        with self._open_lock:
+            if self._open_started:
+                return
+            self._open_started = True
+        threading.Thread(target=self._open, name="mem-open", daemon=True).start()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        等待 PowerMem 打开完成；返回是否已就绪且可用
+        """
+        self.start()
+        return self._ready.wait(timeout) and self._open_error is None
 
     def commit(self, session_id: str, user_msg: str, ai_msg: str):
-        self._memory.add(
-            messages=[
-                {"role": "user", "content": user_msg},
-                {"role": "assistant", "content": ai_msg},
-            ],
-            user_id=session_id,
-            infer=True
-        )
+        turn = [
+            {"role": "user", "content": user_msg},
+            {"role": "assistant", "content": ai_msg},
+        ]
+        with self._lock:
+            closed = self._closed.is_set()
+            if not closed:
+                buf = self._pending.setdefault(session_id, [])
+                buf.extend(turn)
+                if len(buf) < self._batch_turns * 2:
+                    return
+                turn = self._pending.pop(session_id)
+
+        if closed:
+            # 已关闭后不再有刷写，本轮直接同步写入
+            self._add(session_id, turn)
+        else:
+            self._submit(session_id, turn)
+
+    async def acommit(self, session_id: str, user_msg: str, ai_msg: str):
+        # commit 仅在背压时阻塞，放到线程中执行以免阻塞事件循环
+        await asyncio.get_running_loop().run_in_executor(None, self.commit, session_id, user_msg, ai_msg)
+
+    def flush(self):
+        """
+        将所有缓冲中的对话提交写入
+        """
+        with self._lock:
+            # 关闭后剩余缓冲由 close() 同步写入，此处不再取走
+            if self._closed.is_set():
+                return
+            pending, self._pending = self._pending, {}
+
+        for session_id, messages in pending.items():
+            self._submit(session_id, messages)
+
+    def close(self):
+        """
+        等待进行中的写入完成，并同步写入剩余缓冲（进程退出时调用）
+
+        解释器退出阶段线程池已不再接受新任务，剩余缓冲需在当前线程直接写入
+        """
+        self._closed.set()
+        self._executor.shutdown(wait=True)
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        for session_id, messages in pending.items():
+            self._add(session_id, messages)
+
+    def _submit(self, session_id: str, messages: List[Dict]):
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._add, session_id, messages)
+        except RuntimeError:
+            # 线程池已关闭（close() 之后或解释器退出阶段）：归还名额，在当前线程同步写入，不丢批次
+            self._slots.release()
+            self._add(session_id, messages)
+            return
+        future.add_done_callback(lambda _: self._slots.release())
+
+    def _add(self, session_id: str, messages: List[Dict]):
+        store = self._store(self._open_timeout)
+        if store is None:
+            if self._open_error is None:
+                logger.warning("PowerMem not ready, dropping batch for session %s", session_id)
+            return
+        try:
+            store.add(
+                messages=messages,
+                user_id=session_id,
+                infer=True
+            )
+        except Exception:
+            logger.warning("PowerMem add failed for session %s", session_id, exc_info=True)
+
+    def _reset_open_state(self):
+        self._memory: Optional[Memory] = None
+        self._open_error: Optional[Exception] = None
+        self._ready = threading.Event()
+        self._open_started = False
+        self._open_lock = threading.Lock()
+
+    def _open(self):
+        try:
+            self._memory = Memory(config=auto_config())
+        except Exception as e:
+            self._open_error = e
+            logger.error("PowerMem open failed, long-term memory disabled", exc_info=True)
+        finally:
+            self._ready.set()
+
+    def _store(self, timeout: float) -> Optional[Memory]:
+        """
+        获取已打开的 PowerMem；最多等待 timeout 秒，未就绪或打开失败时返回 None
+        """
+        self.start()
+        if not self._ready.wait(timeout):
+            return None
+        return self._memory
+
+    def _after_fork(self):
+        # fork 后线程不会保留，锁也可能停留在被持有状态，子进程内重建
+        # PowerMem 的连接与索引句柄不在进程间共享：丢弃父进程的状态，子进程按需重新打开
+        self._reset_open_state()
+        # fork 前缓冲的轮次仍由父进程负责写入，子进程清空缓冲以免重复写入
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="mem-io")
+        self._slots = threading.BoundedSemaphore(self._max_pending)
+        self._start_flusher()
+
+    def _start_flusher(self):
+        threading.Thread(target=self._flush_loop, name="mem-flush", daemon=True).start()
+
+    def _flush_loop(self):
+        while not self._closed.wait(self._flush_interval):
+            self.flush()
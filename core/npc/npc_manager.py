@@ -1,8 +1,76 @@
 # core/npc/npc_manager.py
 
-import json
 import os
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
+
+import orjson
+
+# get_npc 返回结果中已单独提取、不再放入 meta 的配置项
+_META_EXCLUDE = frozenset(("name", "instruction", "avatar", "description"))
+
+# system prompt 各段标题（含换行）
+_HEADERS = {
+    "bg": "【人物背景与世界设定】\n",
+    "instruction": "【核心任务指令】\n",
+    "identity": "【人物身份与性格】\n",
+    "speech": "【语言风格与表达习惯】\n",
+    "policy": "【互动与行为策略】\n",
+}
+
+# system prompt 固定结尾（统一兜底约束）
+_SYSTEM_CONSTRAINT = (
+    "【系统约束】\n"
+    "你始终以该角色的第一人称视角进行回应，"
+    "不得提及你是模型、AI 或系统提示的存在。"
+)
+
+
+def _render_kv(header: str, d: Dict) -> Optional[str]:
+    """
+    渲染键值型设定块（语言风格、互动策略等）
+
+    参数：
+    - header (str)：块标题（_HEADERS 中的值）
+    - d (Dict)：设定项，值为列表时以逗号连接
+
+    返回：
+    - Optional[str]：格式化后的块，d 为空时返回 None
+    """
+    if not d:
+        return None
+    return header + "\n".join(
+        f"{k}：{', '.join(v) if isinstance(v, list) else v}"
+        for k, v in d.items()
+    )
+
+
+def _render_identity(npc_config: Dict) -> Optional[str]:
+    """
+    渲染人物身份与性格块（description + persona 特质）
+
+    参数：
+    - npc_config (Dict)：npc.json 解析结果
+
+    返回：
+    - Optional[str]：格式化后的块，两者皆空时返回 None
+    """
+    desc = npc_config.get("description")
+    persona = npc_config.get("persona") or {}
+
+    # 每个特质键只取一次值，取到的列表直接参与拼接
+    persona_get = persona.get
+    persona_lines = "\n".join(
+        f"{label}：{', '.join(items)}"
+        for label, items in (
+            ("核心性格特质", persona_get("core_traits")),
+            ("价值观", persona_get("values")),
+            ("性格弱点", persona_get("flaws")),
+        )
+        if items
+    )
+
+    identity_block = "\n".join(part for part in (desc, persona_lines) if part)
+    return _HEADERS["identity"] + identity_block if identity_block else None
 
 
 class NPCManager:
@@ -20,6 +88,16 @@ class NPCManager:
     - LangGraph 流程
     """
 
+    __slots__ = (
+        "npc_dir",
+        "knowledge_base_dir",
+        "_npc_dir_prefix",
+        "_kb_dir_prefix",
+        "_npc_cache",
+        "_config_cache",
+        "_bg_cache",
+    )
+
     def __init__(
         self,
         npc_dir: str,
@@ -27,6 +105,14 @@ class NPCManager:
     ):
         self.npc_dir = npc_dir
         self.knowledge_base_dir = knowledge_base_dir
+        # 路径前缀预先拼好，get_npc 中直接字符串拼接，免去每次 os.path.join
+        self._npc_dir_prefix = os.path.join(npc_dir, "")
+        self._kb_dir_prefix = os.path.join(knowledge_base_dir, "")
+        # npc_id -> ((配置 mtime_ns, 背景 mtime_ns), get_npc 结果)；文件未变化时直接复用
+        self._npc_cache: Dict[str, Tuple[Tuple[int, Optional[int]], Dict]] = {}
+        # npc_id -> (文件 mtime_ns, 解析结果)；文件未变化时跳过读取与解析
+        self._config_cache: Dict[str, Tuple[int, Dict]] = {}
+        self._bg_cache: Dict[str, Tuple[int, Optional[str]]] = {}
 
     # -----------------------------
     # 对外主入口
@@ -40,16 +126,42 @@ class NPCManager:
           "prompt": "...",   # 已拼接好的 system prompt
           "meta": {...}      # 其他配置（可选）
         }
+
+        结果按 (npc.json, background.txt) 的 mtime 缓存，文件未修改时只需两次 stat；
+        返回的是共享对象，调用方应视为只读。
         """
-        npc_config = self._load_npc_config(npc_id)
-        background = self._load_background(npc_id)
+        config_path = f"{self._npc_dir_prefix}{npc_id}.json"
+        config_mtime = self._mtime(config_path)
+        if config_mtime is None:
+            raise FileNotFoundError(f"NPC config not found: {config_path}")
+
+        background_path = f"{self._kb_dir_prefix}{npc_id}{os.sep}background.txt"
+        background_mtime = self._mtime(background_path)
+
+        version = (config_mtime, background_mtime)
+        cached = self._npc_cache.get(npc_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        # stat 与 open 之间文件可能被删除，以 open 的结果为准
+        try:
+            npc_config = self._read_npc_config(npc_id, config_path, config_mtime)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"NPC config not found: {config_path}") from None
+
+        background = None
+        if background_mtime is not None:
+            try:
+                background = self._read_background(npc_id, background_path, background_mtime)
+            except FileNotFoundError:
+                pass
 
         prompt = self._build_prompt(
             npc_config=npc_config,
             background=background,
         )
 
-        return {
+        npc = {
             "id": npc_id,
             "name": npc_config.get("name", npc_id),
             "avatar": npc_config.get("avatar", "/static/avatar/default.jpg"),
@@ -58,9 +170,26 @@ class NPCManager:
             "meta": {
                 k: v
                 for k, v in npc_config.items()
-                if k not in {"name", "instruction", "avatar", "description"}
+                if k not in _META_EXCLUDE
             },
         }
+        self._npc_cache[npc_id] = (version, npc)
+        return npc
+
+    def invalidate(self, npc_id: Optional[str] = None) -> None:
+        """
+        清除 get_npc 及文件读取缓存（文件变更会自动失效，此处用于强制重建）
+
+        npc_id 为 None 时清空全部缓存。
+        """
+        if npc_id is None:
+            self._npc_cache.clear()
+            self._config_cache.clear()
+            self._bg_cache.clear()
+        else:
+            self._npc_cache.pop(npc_id, None)
+            self._config_cache.pop(npc_id, None)
+            self._bg_cache.pop(npc_id, None)
 
     def get_all_npcs(self) -> list:
         """
@@ -69,130 +198,97 @@ class NPCManager:
         [          {"id": "npc_id", "name": "npc_name"},          ...        ]
         """
         npcs = []
-        if os.path.exists(self.npc_dir):
-            for filename in os.listdir(self.npc_dir):
-                if filename.endswith(".json"):
-                    npc_id = filename[:-5]  # 移除.json扩展名
-                    try:
-                        npc_config = self._load_npc_config(npc_id)
-                        npcs.append({
-                            "id": npc_id,
-                            "name": npc_config.get("name", npc_id),
-                            "avatar": npc_config.get("avatar", "/static/avatar/default.jpg"),
-                            "description": npc_config.get("description", "")
-                        })
-                    except FileNotFoundError:
-                        continue
+        # 目录不存在时直接返回空列表，不再单独 exists 检查
+        try:
+            it = os.scandir(self.npc_dir)
+        except FileNotFoundError:
+            return npcs
+
+        # scandir 一次枚举目录：is_file() 使用目录项自带的文件类型，无需额外 stat；
+        # DirEntry.stat() 在 Linux 上仍需一次 stat 调用（结果缓存在 DirEntry 上），用于 mtime 缓存校验
+        with it:
+            for entry in it:
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                npc_id = entry.name[:-5]  # 移除.json扩展名
+                try:
+                    npc_config = self._read_npc_config(
+                        npc_id, entry.path, entry.stat().st_mtime_ns
+                    )
+                except FileNotFoundError:
+                    continue
+                npcs.append({
+                    "id": npc_id,
+                    "name": npc_config.get("name", npc_id),
+                    "avatar": npc_config.get("avatar", "/static/avatar/default.jpg"),
+                    "description": npc_config.get("description", "")
+                })
         return npcs
 
     # -----------------------------
     # 内部方法
     # -----------------------------
-    def _load_npc_config(self, npc_id: str) -> Dict:
-        path = os.path.join(self.npc_dir, f"{npc_id}.json")
-        if not os.path.exists(path):
-            raise FileNotFoundError(f"NPC config not found: {path}")
+    @staticmethod
+    def _mtime(path: str) -> Optional[int]:
+        """返回文件 mtime_ns，文件不存在时返回 None"""
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read_npc_config(self, npc_id: str, path: str, mtime: int) -> Dict:
+        """
+        读取 npc/{npc_id}.json
 
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        按文件 mtime 缓存解析结果，mtime 未变化时不再读取与解析
+        """
+        cached = self._config_cache.get(npc_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with open(path, "rb") as f:
+            config = orjson.loads(f.read())
+        self._config_cache[npc_id] = (mtime, config)
+        return config
 
-    def _load_background(self, npc_id: str) -> Optional[str]:
+    def _read_background(self, npc_id: str, path: str, mtime: int) -> Optional[str]:
         """
         默认读取：
         knowledge_base/{npc_id}/background.txt
 
-        若不存在则返回 None（允许某些 NPC 无背景）
+        文件为空时返回 None（文件不存在由调用方判断，允许某些 NPC 无背景）
+        按文件 mtime 缓存解码后的文本，mtime 未变化时不再读取与解码
         """
-        path = os.path.join(
-            self.knowledge_base_dir,
-            npc_id,
-            "background.txt",
-        )
-        if not os.path.exists(path):
-            return None
+        cached = self._bg_cache.get(npc_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
 
-        with open(path, "r", encoding="utf-8") as f:
-            text = f.read().strip()
-            return text if text else None
+        # 背景文件仅数 KB，一次读入字节后解码，省去文本层的逐块解码；
+        # 换行按文本模式的通用换行规则转换（\r\n 与单独的 \r 均视为 \n）
+        with open(path, "rb") as f:
+            text = f.read().decode("utf-8").replace("\r\n", "\n").replace("\r", "\n").strip()
+        background = text if text else None
+        self._bg_cache[npc_id] = (mtime, background)
+        return background
 
     def _build_prompt(self, npc_config: Dict, background: Optional[str]) -> str:
-        sections = []
-
-        # 1️⃣ 背景（客观事实）
-        if background:
-            sections.append(
-                f"【人物背景与世界设定】\n{background}"
-            )
-
-        # 2️⃣ 指令（核心任务）
-        instruction = npc_config.get("instruction", "")
-        if instruction:
-            sections.append(
-                f"【核心任务指令】\n{instruction}"
-            )
-
-        # 3️⃣ 身份 + 性格
-        desc = npc_config.get("description")
-        persona = npc_config.get("persona", {})
-
-        persona_lines = []
-        if persona:
-            if persona.get("core_traits"):
-                persona_lines.append(
-                    f"核心性格特质：{', '.join(persona['core_traits'])}"
-                )
-            if persona.get("values"):
-                persona_lines.append(
-                    f"价值观：{', '.join(persona['values'])}"
-                )
-            if persona.get("flaws"):
-                persona_lines.append(
-                    f"性格弱点：{', '.join(persona['flaws'])}"
-                )
-
-        identity_block = []
-        if desc:
-            identity_block.append(desc)
-        if persona_lines:
-            identity_block.append("\n".join(persona_lines))
-
-        if identity_block:
-            sections.append(
-                "【人物身份与性格】\n" + "\n".join(identity_block)
-            )
-
-        # 3️⃣ 语言风格
-        speech = npc_config.get("speech_style", {})
-        if speech:
-            style_lines = []
-            for k, v in speech.items():
-                if isinstance(v, list):
-                    style_lines.append(f"{k}：{', '.join(v)}")
-                else:
-                    style_lines.append(f"{k}：{v}")
-            sections.append(
-                "【语言风格与表达习惯】\n" + "\n".join(style_lines)
-            )
+        instruction = npc_config.get("instruction")
 
-        # 4️⃣ 互动策略
-        policy = npc_config.get("interaction_policy", {})
-        if policy:
-            policy_lines = []
-            for k, v in policy.items():
-                if isinstance(v, list):
-                    policy_lines.append(f"{k}：{', '.join(v)}")
-                else:
-                    policy_lines.append(f"{k}：{v}")
-            sections.append(
-                "【互动与行为策略】\n" + "\n".join(policy_lines)
+        return "\n\n".join(
+            section
+            for section in (
+                # 1️⃣ 背景（客观事实）
+                _HEADERS["bg"] + background if background else None,
+                # 2️⃣ 指令（核心任务）
+                _HEADERS["instruction"] + instruction if instruction else None,
+                # 3️⃣ 身份 + 性格
+                _render_identity(npc_config),
+                # 3️⃣ 语言风格
+                _render_kv(_HEADERS["speech"], npc_config.get("speech_style")),
+                # 4️⃣ 互动策略
+                _render_kv(_HEADERS["policy"], npc_config.get("interaction_policy")),
+                # 5️⃣ 系统约束（统一兜底）
+                _SYSTEM_CONSTRAINT,
             )
-
-        # 5️⃣ 系统约束（统一兜底）
-        sections.append(
-            "【系统约束】\n"
-            "你始终以该角色的第一人称视角进行回应，"
-            "不得提及你是模型、AI 或系统提示的存在。"
+            if section
         )
-
-        return "\n\n".join(sections)
-
@@ -3,7 +3,7 @@
 # 职责：生成和维护会话ID，防止不同NPC或用户的记忆串用
 # 设计：单主体版本，后续可扩展为多用户/多主体支持
 
-import uuid
+import secrets
 from typing import Optional
 
 
@@ -21,6 +21,8 @@ class SessionManager:
     - 后续可扩展为多用户/多主体支持
     """
 
+    __slots__ = ()
+
     def get_or_create(self, session_id: Optional[str]) -> str:
         """
         获取或创建会话ID
@@ -31,6 +33,6 @@ class SessionManager:
         返回：
         - str：有效的会话ID
         """
-        if session_id and isinstance(session_id, str):
+        if type(session_id) is str and session_id:
             return session_id
-        return uuid.uuid4().hex
+        return secrets.token_hex(16)
@@ -0,0 +1,28 @@
+# gunicorn.conf.py
+# 生产部署配置
+# 用法：gunicorn app:app（gunicorn 会自动读取当前目录下的本文件）
+# 设计：preload_app 在主进程完成 NPCManager / LangGraphAgent 初始化后再 fork worker，
+#      gthread 让多个请求在等待 LLM 网络响应时并发执行
+
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# 对话日志与回复缓存均为进程内存储，多 worker 之间不共享；
+# 默认单 worker + 多线程，外置这些状态后再调大 WEB_CONCURRENCY
+workers = int(os.getenv("WEB_CONCURRENCY", 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+
+preload_app = True
+
+# LLM 回复可能较慢，避免 worker 被误判超时
+timeout = 120
+
+
+def post_fork(server, worker):
+    # PowerMem 与预热（WARMUP=1）都不在主进程进行：每个 worker fork 之后在后台自行打开与预热，
+    # 首个请求前即开始加载
+    from app import langgraph_agent
+
+    langgraph_agent.start()
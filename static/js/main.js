@@ -184,8 +184,11 @@ async function sendMessage(npcId) {
     // Display user message
     displayMessage(userMessage, 'user');
     
-    // Send message to server
+    // Send message to server, streaming the reply when possible
     try {
+        const streamed = await streamMessage(npcId, userMessage);
+        if (streamed) return;
+        
         const response = await fetch('/api/chat', {
             method: 'POST',
             headers: {
@@ -210,6 +213,73 @@ async function sendMessage(npcId) {
     }
 }
 
+async function streamMessage(npcId, userMessage) {
+    // Stream NPC response via SSE; returns false if streaming is unavailable
+    const response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+            npc_id: npcId,
+            message: userMessage
+        })
+    });
+    
+    // Only fall back to /api/chat when the streaming endpoint itself is missing
+    if (response.status === 404 || response.status === 405 || (response.ok && !response.body)) {
+        return false;
+    }
+    if (!response.ok) {
+        throw new Error('Failed to send message');
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const messageDiv = displayMessage('', 'npc');
+    const chatMessages = document.querySelector('.chat-messages');
+    let buffer = '';
+    let done = false;
+    
+    try {
+        while (!done) {
+            const { done: streamEnded, value } = await reader.read();
+            if (streamEnded) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            
+            for (const event of events) {
+                if (!event.startsWith('data: ')) continue;
+                const data = JSON.parse(event.slice(6));
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                if (data.delta) {
+                    messageDiv.textContent += data.delta;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                }
+                if (data.done) {
+                    done = true;
+                }
+            }
+        }
+        
+        // A stream that closes without the done event was cut off
+        if (!done) {
+            throw new Error('Stream ended before completion');
+        }
+    } catch (error) {
+        if (!messageDiv.textContent) {
+            messageDiv.remove();
+        }
+        throw error;
+    }
+    
+    return true;
+}
+
 function displayMessage(message, sender) {
     // Display message in chat
     const chatMessages = document.querySelector('.chat-messages');
@@ -221,6 +291,8 @@ function displayMessage(message, sender) {
     
     // Scroll to bottom
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    
+    return messageDiv;
 }
 
 // Memory visualization functions
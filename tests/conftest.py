@@ -0,0 +1,76 @@
+# tests/conftest.py
+# 测试公共夹具：以假 LLM、假 PowerMem 与空长期记忆替换代理依赖，测试不访问外部服务
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("API_KEY", "test-key")
+
+
+class FakeLLM:
+    """
+    按顺序返回预设回复的假 LLM；stream_error 非空时在产出全部片段后抛出该异常
+    """
+
+    def __init__(self, replies, stream_error=None):
+        self.replies = list(replies)
+        self.stream_error = stream_error
+
+    def invoke(self, messages):
+        return SimpleNamespace(content=self.replies.pop(0))
+
+    def stream(self, messages):
+        for part in self.replies.pop(0):
+            yield SimpleNamespace(content=part)
+        if self.stream_error is not None:
+            raise self.stream_error
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+    async def astream(self, messages):
+        for chunk in self.stream(messages):
+            yield chunk
+
+
+class FakeMemory:
+    """
+    记录 add 调用、按 PowerMem 的返回结构应答 search 的假 Memory
+    """
+
+    def __init__(self, config=None):
+        self.added = []
+        self.hits = []
+
+    def add(self, messages, user_id, infer=True):
+        self.added.append((user_id, list(messages)))
+
+    def search(self, query, user_id, limit=5):
+        return {"results": self.hits[:limit], "relations": []}
+
+
+@pytest.fixture
+def flask_app(monkeypatch):
+    import app as app_module
+
+    agent = app_module.langgraph_agent
+    monkeypatch.setattr(agent.memory, "recall", lambda **kwargs: "")
+    monkeypatch.setattr(agent.memory, "commit", lambda *args: None)
+    for key in list(agent.log._logs):
+        agent.log.clear(*key)
+    return app_module
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.app.test_client()
+
+
+@pytest.fixture
+def use_llm(flask_app, monkeypatch):
+    def install(llm):
+        monkeypatch.setattr(flask_app.langgraph_agent, "llm", llm)
+        return llm
+    return install
@@ -0,0 +1,132 @@
+# tests/test_agent.py
+# 对话代理测试：以假 LLM 与假 PowerMem 替换外部依赖
+
+import asyncio
+import dataclasses
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import FakeLLM, FakeMemory
+from core.agent import langgraph_agent as agent_module
+from core.config import settings
+from core.memory import memory_store
+from core.npc.npc_manager import NPCManager
+
+
+class CountingMemory(FakeMemory):
+    opened = 0
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        type(self).opened += 1
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def make_agent(monkeypatch):
+    CountingMemory.opened = 0
+    monkeypatch.setattr(memory_store, "Memory", CountingMemory)
+    monkeypatch.setattr(memory_store, "auto_config", lambda: None)
+
+    def make(**overrides):
+        cfg = dataclasses.replace(settings(), **overrides)
+        monkeypatch.setattr(agent_module, "settings", lambda: cfg)
+        npc_manager = NPCManager(os.path.join(ROOT, "npc"), os.path.join(ROOT, "knowledge_base"))
+        return agent_module.LangGraphAgent(npc_manager)
+
+    return make
+
+
+def test_constructor_does_no_background_work(make_agent, monkeypatch):
+    warmed = threading.Event()
+    monkeypatch.setattr(agent_module.LangGraphAgent, "_warmup", lambda self: warmed.set())
+
+    agent = make_agent(warmup=True)
+
+    # gunicorn preload 下构造发生在主进程：不得打开 PowerMem，也不得发起预热
+    assert not warmed.wait(0.2)
+    assert CountingMemory.opened == 0
+
+    agent.start()
+
+    assert warmed.wait(5)
+    assert agent.memory.wait_ready(5)
+    assert CountingMemory.opened == 1
+    agent.memory.close()
+
+
+def _history(agent):
+    return [(e["user"], e["assistant"]) for e in agent.log.recent("s1", "lin_daiyu")]
+
+
+def test_arun_returns_reply_and_records_turn(make_agent):
+    agent = make_agent()
+    fake = FakeLLM(["你好"])
+    agent._async_llm = lambda: fake
+
+    assert asyncio.run(agent.arun("s1", "lin_daiyu", "hi")) == "你好"
+    assert _history(agent) == [("hi", "你好")]
+    agent.memory.close()
+    assert agent.memory._memory.added[0][1][0] == {"role": "user", "content": "hi"}
+
+
+def test_astream_records_only_completed_replies(make_agent):
+    agent = make_agent()
+
+    async def collect(llm, text):
+        agent._async_llm = lambda: llm
+        return [part async for part in agent.astream("s1", "lin_daiyu", text)]
+
+    assert asyncio.run(collect(FakeLLM([["你", "好"]]), "hi")) == ["你", "好"]
+    with pytest.raises(RuntimeError):
+        asyncio.run(collect(FakeLLM([["半"]], stream_error=RuntimeError("boom")), "again"))
+
+    assert _history(agent) == [("hi", "你好")]
+
+
+def test_closed_loop_connections_are_released(make_agent):
+    disconnected = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def finish(self):
+            super().finish()
+            disconnected.set()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    agent = make_agent()
+
+    async def request():
+        llm = agent._async_llm()
+        await llm.http_async_client.get(f"http://127.0.0.1:{server.server_port}/")
+        return llm
+
+    first = asyncio.run(request())
+    # 循环已关闭，保活连接仍挂在旧连接池上
+    assert not disconnected.wait(0.2)
+
+    async def next_loop():
+        return agent._async_llm()
+
+    second = asyncio.run(next_loop())
+
+    assert second is not first
+    assert list(agent._async_llms.values()) == [second]
+    assert disconnected.wait(5)
+    server.shutdown()
+    server.server_close()
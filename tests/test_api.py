@@ -0,0 +1,60 @@
+# tests/test_api.py
+# 接入层接口测试
+
+import orjson
+
+from conftest import FakeLLM
+
+
+def _events(response):
+    return [
+        orjson.loads(chunk[len(b"data: "):])
+        for chunk in response.get_data().split(b"\n\n")
+        if chunk.startswith(b"data: ")
+    ]
+
+
+def test_chat_stream_emits_deltas_then_done(client, use_llm, flask_app):
+    use_llm(FakeLLM([["你", "好"]]))
+
+    response = client.post("/api/chat/stream", json={"npc_id": "lin_daiyu", "message": "hi"})
+
+    assert _events(response) == [{"delta": "你"}, {"delta": "好"}, {"done": True}]
+    log = flask_app.conversation_log.recent(flask_app.DEFAULT_SESSION_ID, "lin_daiyu")
+    assert [(e["user"], e["assistant"]) for e in log] == [("hi", "你好")]
+
+
+def test_chat_stream_error_sends_error_event_and_records_nothing(client, use_llm, flask_app):
+    use_llm(FakeLLM([["a", "b"]], stream_error=RuntimeError("boom")))
+
+    response = client.post("/api/chat/stream", json={"npc_id": "lin_daiyu", "message": "x"})
+
+    events = _events(response)
+    assert events[:2] == [{"delta": "a"}, {"delta": "b"}]
+    assert "error" in events[-1]
+    assert {"done": True} not in events
+    assert flask_app.conversation_log.recent(flask_app.DEFAULT_SESSION_ID, "lin_daiyu") == []
+
+
+def test_chat_stream_unknown_npc_fails_before_streaming(client, use_llm):
+    use_llm(FakeLLM([]))
+
+    response = client.post("/api/chat/stream", json={"npc_id": "no_such_npc", "message": "x"})
+
+    assert response.status_code == 500
+    assert response.mimetype != "text/event-stream"
+
+
+def test_memories_round_trip_through_chat(client, use_llm):
+    use_llm(FakeLLM(["林姑娘的回复", "宝钗的回复"]))
+    client.post("/api/chat", json={"npc_id": "lin_daiyu", "message": "你好"})
+    client.post("/api/chat", json={"npc_id": "xue_baochai", "message": "你是谁"})
+
+    memories = client.get("/api/memories/lin_daiyu").get_json()
+    assert [(m["user_message"], m["assistant_message"]) for m in memories] == [
+        ("你好", "林姑娘的回复")
+    ]
+
+    assert client.delete("/api/memories/lin_daiyu").status_code == 200
+    assert client.get("/api/memories/lin_daiyu").get_json() == []
+    assert len(client.get("/api/memories/xue_baochai").get_json()) == 1
@@ -0,0 +1,81 @@
+# tests/test_memory_store.py
+# 长期记忆封装层测试：以假 PowerMem 替换 Memory，不加载嵌入模型与索引
+
+import pytest
+
+from conftest import FakeMemory
+from core.memory import memory_store
+
+
+@pytest.fixture
+def make_store(monkeypatch):
+    monkeypatch.setattr(memory_store, "Memory", FakeMemory)
+    monkeypatch.setattr(memory_store, "auto_config", lambda: None)
+    stores = []
+
+    def make(**kwargs):
+        kwargs.setdefault("flush_interval", 3600)
+        store = memory_store.MemoryStore(**kwargs)
+        assert store.wait_ready(5)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_recall_reads_memory_field_from_search_results(make_store):
+    store = make_store()
+    store._memory.hits = [
+        {"memory": "喜欢葬花", "score": 0.9},
+        {"memory": "", "score": 0.5},
+        {"content": "常住潇湘馆", "score": 0.4},
+    ]
+
+    assert store.recall("s1", "黛玉") == "- 喜欢葬花\n- 常住潇湘馆"
+
+
+def test_recall_empty_results(make_store):
+    store = make_store()
+
+    assert store.recall("s1", "黛玉") == ""
+
+
+def test_commit_batches_turns_and_close_writes_the_rest(make_store):
+    store = make_store(batch_turns=2)
+
+    for i in range(3):
+        store.commit("s1", f"问{i}", f"答{i}")
+    store.close()
+
+    added = store._memory.added
+    assert [(user_id, len(messages)) for user_id, messages in added] == [("s1", 4), ("s1", 2)]
+    assert added[0][1][0] == {"role": "user", "content": "问0"}
+    assert added[1][1] == [
+        {"role": "user", "content": "问2"},
+        {"role": "assistant", "content": "答2"},
+    ]
+
+
+def test_commit_after_close_writes_synchronously(make_store):
+    store = make_store(batch_turns=4)
+    store.close()
+
+    store.commit("s1", "问", "答")
+
+    assert store._memory.added == [
+        ("s1", [{"role": "user", "content": "问"}, {"role": "assistant", "content": "答"}]),
+    ]
+
+
+def test_submit_releases_slot_when_executor_rejects(make_store):
+    store = make_store(batch_turns=1, max_pending=1)
+    # 模拟解释器退出阶段：线程池已关闭但 close() 尚未执行
+    store._executor.shutdown()
+
+    store.commit("s1", "问0", "答0")
+    store.commit("s1", "问1", "答1")
+
+    assert [len(messages) for _, messages in store._memory.added] == [2, 2]
+    assert store._slots.acquire(blocking=False)